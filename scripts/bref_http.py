@@ -0,0 +1,100 @@
+"""
+Shared HTTP helpers for the Basketball Reference scrapers.
+
+Both scrape_box_scores.py and scrape_players.py fetch pages through a
+session built here, so pacing, retries and caching only live in one place.
+"""
+
+import os
+import re
+import time
+from datetime import timedelta
+
+import requests
+import requests_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+HEADERS = {"User-Agent": "Mozilla/5.0 (Macintosh)"}
+RATE_LIMIT_SECONDS = 3.5  # stay under bref's 20 req/min
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "bref_cache")
+
+# Basketball Reference hides some tables inside HTML comments; this matches
+# a commented-out <div> wrapper so it can be unwrapped before parsing.
+COMMENTED_DIV_RE = re.compile(rb"<!--\s*(<div[^>]*>.*?</div>)\s*-->", re.DOTALL)
+
+_last_fetch_at = float("-inf")
+
+
+def create_session(expire_after: timedelta) -> requests_cache.CachedSession:
+    """Build the pooled, disk-cached session used for every bref request.
+
+    Reuses the TCP/TLS connection, retries transient 429/5xx responses with
+    backoff, and lets reruns skip refetching pages younger than expire_after.
+    Entries that have already expired are pruned up front so the cache file
+    doesn't keep growing across runs. The file isn't vacuumed, so it doesn't
+    shrink; sqlite reuses the freed pages for new entries instead. Vacuuming
+    would rebuild the whole shared file on every run.
+    """
+    session = requests_cache.CachedSession(CACHE_PATH, backend="sqlite", expire_after=expire_after)
+    session.cache.delete(expired=True, vacuum=False)
+    session.headers.update(HEADERS)
+    session.mount("https://", HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=8,
+        max_retries=Retry(total=3, backoff_factor=1.0, status_forcelist=[429, 500, 502, 503, 504]),
+    ))
+    return session
+
+
+def wait_for_rate_limit():
+    """Sleep until RATE_LIMIT_SECONDS have passed since the previous fetch started.
+
+    Parsing and DB work done between fetches counts toward the wait instead
+    of stacking on top of a fixed sleep.
+    """
+    global _last_fetch_at
+    remaining = _last_fetch_at + RATE_LIMIT_SECONDS - time.monotonic()
+    if remaining > 0:
+        time.sleep(remaining)
+    _last_fetch_at = time.monotonic()
+
+
+def get_page(session: requests_cache.CachedSession, url: str, force: bool = False) -> requests.Response:
+    """GET a bref page, serving it from the local cache when possible.
+
+    With force, the cache is skipped and the fresh response replaces the
+    cached copy. Only requests that actually go out to bref wait on the
+    rate limit.
+    """
+    if not force:
+        resp = session.get(url, only_if_cached=True)
+        if resp.status_code != 504:  # cache misses come back as a synthetic 504
+            return resp
+    wait_for_rate_limit()
+    return session.get(url, timeout=30, force_refresh=force)
+
+
+def evict_page(session: requests_cache.CachedSession, url: str):
+    """Drop a cached page that turned out to be unusable, so the next run refetches it."""
+    session.cache.delete(urls=[url], vacuum=False)
+
+
+def stat_int(val: str) -> int | None:
+    """Convert stripped stat-cell text ('12', '+3', '-2', '') to an int."""
+    if not val:
+        return None
+    try:
+        return int(val)
+    except ValueError:
+        return None
+
+
+def stat_float(val: str) -> float | None:
+    """Convert stripped stat-cell text ('.482', '31.4', '') to a float."""
+    if not val:
+        return None
+    try:
+        return round(float(val), 3)
+    except ValueError:
+        return None
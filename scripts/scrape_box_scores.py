@@ -4,24 +4,41 @@ Scrape box scores from Basketball Reference and insert into Supabase.
 
 Usage:
   python scripts/scrape_box_scores.py --season 2024 [--days 7] [--limit 10]
+
+Fetched pages are cached in scripts/.cache/bref_cache.sqlite for 30 days;
+delete it to force a refetch. Pages run about 400 KB each, so a full-season
+backfill can leave close to 1 GB there. Later runs prune expired pages and
+reuse their space, but the file itself never shrinks. Set SUPABASE_DB_URL
+(the project's Postgres connection string) to bulk-load box scores with
+COPY instead of the REST API.
 """
 
 import argparse
 import os
-import re
-import sys
-import time
+import queue
+import threading
 from datetime import datetime, timedelta
 
+import lxml.etree
+import lxml.html
 import requests
-from bs4 import BeautifulSoup, Comment
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
+from bref_http import COMMENTED_DIV_RE, create_session, evict_page, get_page, stat_float, stat_int
+
+try:
+    import psycopg
+    from psycopg import sql
+except ImportError:  # optional: only needed for the COPY bulk-load path
+    psycopg = None
+
 load_dotenv()
 
 SUPABASE_URL = os.environ.get("SUPABASE_URL") or os.environ["EXPO_PUBLIC_SUPABASE_URL"]
 SUPABASE_SERVICE_KEY = os.environ["SUPABASE_SERVICE_ROLE_KEY"]
+# Direct Postgres connection string; when set, box scores are bulk-loaded with COPY
+SUPABASE_DB_URL = os.environ.get("SUPABASE_DB_URL")
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 
@@ -32,6 +49,62 @@ ABBREV_TO_BREF = {
     "CHA": "CHO",
 }
 
+# box_scores columns filled from each bref table, as (column, data-stat) pairs
+BASIC_INT_STATS = (
+    ("points", "pts"),
+    ("rebounds", "trb"),
+    ("offensive_rebounds", "orb"),
+    ("defensive_rebounds", "drb"),
+    ("assists", "ast"),
+    ("steals", "stl"),
+    ("blocks", "blk"),
+    ("turnovers", "tov"),
+    ("fgm", "fg"),
+    ("fga", "fga"),
+    ("tpm", "fg3"),
+    ("tpa", "fg3a"),
+    ("ftm", "ft"),
+    ("fta", "fta"),
+    ("personal_fouls", "pf"),
+    ("plus_minus", "plus_minus"),
+)
+BASIC_FLOAT_STATS = (
+    ("fg_pct", "fg_pct"),
+    ("tp_pct", "fg3_pct"),
+    ("ft_pct", "ft_pct"),
+)
+ADVANCED_INT_STATS = (
+    ("offensive_rating", "off_rtg"),
+    ("defensive_rating", "def_rtg"),
+)
+ADVANCED_FLOAT_STATS = (
+    ("ts_pct", "ts_pct"),
+    ("efg_pct", "efg_pct"),
+    ("three_par", "fg3a_per_fga_pct"),
+    ("ft_rate", "fta_per_fga_pct"),
+    ("orb_pct", "orb_pct"),
+    ("drb_pct", "drb_pct"),
+    ("trb_pct", "trb_pct"),
+    ("ast_pct", "ast_pct"),
+    ("stl_pct", "stl_pct"),
+    ("blk_pct", "blk_pct"),
+    ("tov_pct", "tov_pct"),
+    ("usg_pct", "usg_pct"),
+    ("bpm", "bpm"),
+)
+
+# Buffer this many scraped games before writing to Supabase, and cap each
+# box_scores REST upsert request at this many rows.
+FLUSH_EVERY_GAMES = 500
+UPSERT_CHUNK_ROWS = 5000
+BOX_SCORE_KEY = ("game_id", "team_id", "player_name")
+
+# Box score pages are parsed straight into an lxml tree; bref serves UTF-8.
+HTML_PARSER = lxml.html.HTMLParser(encoding="utf-8")
+
+# Box scores of final games don't change, so cached pages keep for 30 days.
+SESSION = create_session(expire_after=timedelta(days=30))
+
 
 def to_bref(abbrev: str) -> str:
     return ABBREV_TO_BREF.get(abbrev, abbrev)
@@ -46,37 +119,21 @@ def safe_int(val) -> int | None:
         return None
 
 
-def safe_float(val) -> float | None:
-    if val is None or str(val).strip() == "":
-        return None
-    try:
-        return round(float(val), 3)
-    except (ValueError, TypeError):
-        return None
-
-
 def fetch_games_without_box_scores(season_year: int, days: int | None, limit: int | None):
     """Get games that are final but have no box_scores rows yet."""
+    # The view does the final/no-box-scores anti-join server-side; inner-joining
+    # seasons filters by year in the same request
     query = (
-        supabase.table("games")
+        supabase.table("games_needing_box_scores")
         .select(
-            "id, game_date_utc, home_team_id, away_team_id, home_q1, "
+            "id, game_date_utc, home_team_id, away_team_id, "
             "home_team:teams!games_home_team_id_fkey(id, abbreviation), "
             "away_team:teams!games_away_team_id_fkey(id, abbreviation), "
-            "season:seasons(year)"
+            "season:seasons!inner(year)"
         )
-        .eq("status", "final")
-        .is_("home_q1", "null")  # no quarter scores yet = not scraped
+        .eq("season.year", season_year)
     )
 
-    # Filter by season
-    season_res = supabase.table("seasons").select("id").eq("year", season_year).execute()
-    if not season_res.data:
-        print(f"No season found for year {season_year}")
-        sys.exit(1)
-    season_ids = [s["id"] for s in season_res.data]
-    query = query.in_("season_id", season_ids)
-
     if days:
         cutoff = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
         query = query.gte("game_date_utc", cutoff)
@@ -88,66 +145,67 @@ def fetch_games_without_box_scores(season_year: int, days: int | None, limit: in
     return res.data or []
 
 
-def fetch_game_page(home_abbrev: str, game_date: str):
-    """Fetch and parse the Basketball Reference box score page."""
+def game_page_url(home_abbrev: str, game_date: str) -> str:
+    """Basketball Reference box score URL for a game, keyed by date and home team."""
     dt = datetime.strptime(game_date[:10], "%Y-%m-%d")
     date_str = dt.strftime("%Y%m%d")
     bref_home = to_bref(home_abbrev)
-    url = f"https://www.basketball-reference.com/boxscores/{date_str}0{bref_home}.html"
+    return f"https://www.basketball-reference.com/boxscores/{date_str}0{bref_home}.html"
 
-    resp = requests.get(url, headers={"User-Agent": "Mozilla/5.0 (Macintosh)"})
+
+def fetch_game_page(home_abbrev: str, game_date: str):
+    """Fetch and parse the Basketball Reference box score page."""
+    url = game_page_url(home_abbrev, game_date)
+
+    try:
+        resp = get_page(SESSION, url)
+    except requests.RequestException as e:
+        print(f"  Failed to fetch {url} ({e})")
+        return None, url
     if resp.status_code != 200:
         print(f"  Failed to fetch {url} (status {resp.status_code})")
         return None, url
 
     # Basketball Reference hides advanced tables inside HTML comments.
-    # Uncomment them so BeautifulSoup can find them.
-    html = resp.text
-    html = re.sub(r'<!--\s*(<div[^>]*>.*?</div>)\s*-->', r'\1', html, flags=re.DOTALL)
+    # Uncomment them so they end up in the parsed tree.
+    html = COMMENTED_DIV_RE.sub(rb"\1", resp.content)
 
-    soup = BeautifulSoup(html, "html.parser")
-    return soup, url
+    try:
+        tree = lxml.html.fromstring(html, parser=HTML_PARSER)
+    except lxml.etree.ParserError as e:
+        # Drop the bad copy, or every rerun would skip this game from cache
+        print(f"  Failed to parse {url} ({e})")
+        evict_page(SESSION, url)
+        return None, url
+    return tree, url
 
 
-def parse_box_score_table(soup, table_id: str) -> list[dict]:
-    """Parse a basic or advanced box score table into a list of dicts."""
-    table = soup.find("table", {"id": table_id})
-    if not table:
-        return []
+def index_tables(tree) -> dict:
+    """Map table id -> <table> element in a single pass over the page."""
+    return {t.get("id"): t for t in tree.iter("table") if t.get("id")}
 
-    # Get column names from the second header row (first is the group header)
-    header_rows = table.find("thead").find_all("tr")
-    header_row = header_rows[-1]  # last header row has the actual column names
-    cols = []
-    for th in header_row.find_all("th"):
-        stat = th.get("data-stat", th.get_text(strip=True))
-        cols.append(stat)
 
-    rows = []
-    tbody = table.find("tbody")
-    if not tbody:
+def parse_box_score_table(table) -> list[dict]:
+    """Parse a basic or advanced box score <table> element into a list of dicts."""
+    if table is None:
         return []
 
-    starter_count = 0
+    rows = []
     seen_reserves = False
-    for tr in tbody.find_all("tr"):
+    for tr in table.xpath("./tbody/tr"):
         # Skip separator rows (class="thead" marks the Reserves divider)
-        if "thead" in tr.get("class", []):
+        if "thead" in tr.get("class", "").split():
             seen_reserves = True
             continue
 
-        cells = tr.find_all(["th", "td"])
-        if not cells:
-            continue
-
-        row_data = {}
-        for i, cell in enumerate(cells):
-            if i < len(cols):
-                row_data[cols[i]] = cell.get_text(strip=True)
+        row_data = {
+            cell.get("data-stat"): cell.text_content().strip()
+            for cell in tr
+            if cell.get("data-stat")
+        }
 
         # Skip "Did Not Play" rows
-        reason_cell = tr.find("td", {"data-stat": "reason"})
-        if reason_cell:
+        if not row_data or "reason" in row_data:
             continue
 
         player_name = row_data.get("player", "")
@@ -155,30 +213,19 @@ def parse_box_score_table(soup, table_id: str) -> list[dict]:
             continue
 
         row_data["_starter"] = not seen_reserves
-        if not seen_reserves:
-            starter_count += 1
         rows.append(row_data)
 
     return rows
 
 
-def parse_quarter_scores(soup):
+def parse_quarter_scores(tree):
     """Parse the line_score table for quarter-by-quarter scores."""
-    table = soup.find("table", {"id": "line_score"})
-    if not table:
-        return None
-
-    tbody = table.find("tbody")
-    if not tbody:
-        return None
-
-    rows = tbody.find_all("tr")
+    rows = tree.xpath('//table[@id="line_score"]/tbody/tr')
     if len(rows) < 2:
         return None
 
     def parse_row(row):
-        cells = row.find_all("td")
-        return [safe_int(c.get_text(strip=True)) for c in cells]
+        return [safe_int(c.text_content().strip()) for c in row.xpath("./td")]
 
     away_scores = parse_row(rows[0])
     home_scores = parse_row(rows[1])
@@ -198,12 +245,12 @@ def parse_quarter_scores(soup):
     return result
 
 
-def parse_playoff_round(soup):
+def parse_playoff_round(tree):
     """Parse playoff round from page title."""
-    title_tag = soup.find("title")
-    if not title_tag:
+    title = tree.findtext(".//title")
+    if not title:
         return None
-    title = title_tag.get_text().lower()
+    title = title.lower()
     if "first round" in title:
         return "first_round"
     if "conference semifinals" in title:
@@ -215,35 +262,64 @@ def parse_playoff_round(soup):
     return None
 
 
-def parse_arena_attendance(soup):
+def parse_arena_attendance(tree):
     """Parse arena name and attendance from the page."""
     arena = None
     attendance = None
 
     # Arena is in scorebox_meta, second div (after date)
-    scorebox = soup.find("div", class_="scorebox_meta")
+    scorebox = tree.find_class("scorebox_meta")
     if scorebox:
-        divs = scorebox.find_all("div")
+        divs = scorebox[0].xpath(".//div")
         if len(divs) >= 2:
-            candidate = divs[1].get_text(strip=True)
+            candidate = divs[1].text_content().strip()
             if not candidate.startswith("Attendance") and not candidate.startswith("Logo"):
                 arena = candidate.split(",")[0].strip() if "," in candidate else candidate.strip()
 
     # Attendance is in a separate <div><strong>Attendance:</strong>19,156</div>
-    att_strong = soup.find("strong", string=re.compile(r"Attendance"))
+    att_strong = tree.xpath('//strong[contains(text(), "Attendance")]')
     if att_strong:
-        att_text = att_strong.parent.get_text(strip=True)
+        att_text = att_strong[0].getparent().text_content()
         att_str = att_text.replace("Attendance:", "").replace("\xa0", "").replace(",", "").strip()
         attendance = safe_int(att_str)
 
     return arena, attendance
 
 
-def scrape_game(game: dict):
-    """Scrape box scores for a single game and insert into Supabase."""
+def fetch_game_pages(games: list[dict], pages: queue.Queue):
+    """Fetch each game's page in order and hand it to the parsing thread.
+
+    Puts (game, tree) pairs on the queue, with tree=None when the fetch
+    or parse failed, then a final None once every game has been fetched.
+    """
+    try:
+        for game in games:
+            home_abbrev = game["home_team"]["abbreviation"]
+            away_abbrev = game["away_team"]["abbreviation"]
+            print(f"\nFetching {away_abbrev} @ {home_abbrev} on {game['game_date_utc'][:10]}...")
+
+            # Single page fetch gets everything. Anything it raises (e.g. lxml
+            # rejecting an empty body) only skips this game, so one bad page
+            # can't end the thread and cut the run short.
+            try:
+                tree, url = fetch_game_page(home_abbrev, game["game_date_utc"])
+            except Exception as e:
+                print(f"  Error fetching {away_abbrev} @ {home_abbrev}: {e}")
+                tree = None
+            pages.put((game, tree))
+            del tree  # don't keep this page alive through the next fetch
+    finally:
+        pages.put(None)
+
+
+def scrape_game(game: dict, tree):
+    """Parse box scores for a single game from its fetched page.
+
+    Returns (box_rows, update_data) for the caller to write in batches,
+    or None if no box score rows could be parsed.
+    """
     home_team = game["home_team"]
     away_team = game["away_team"]
-    game_date = game["game_date_utc"]
     game_id = game["id"]
 
     home_abbrev = home_team["abbreviation"]
@@ -251,105 +327,61 @@ def scrape_game(game: dict):
     bref_away = to_bref(away_abbrev)
     bref_home = to_bref(home_abbrev)
 
-    print(f"\nScraping {away_abbrev} @ {home_abbrev} on {game_date[:10]}...")
-
-    # Single page fetch gets everything
-    time.sleep(3.5)  # rate limit: stay under 20 req/min
-    soup, url = fetch_game_page(home_abbrev, game_date)
-    if not soup:
-        return False
-
     # 1) Parse basic + advanced box scores for both teams
+    tables = index_tables(tree)
     box_rows = []
     for team_bref, team_info in [(bref_away, away_team), (bref_home, home_team)]:
-        basic_rows = parse_box_score_table(soup, f"box-{team_bref}-game-basic")
-        adv_rows = parse_box_score_table(soup, f"box-{team_bref}-game-advanced")
+        basic_rows = parse_box_score_table(tables.get(f"box-{team_bref}-game-basic"))
+        adv_rows = parse_box_score_table(tables.get(f"box-{team_bref}-game-advanced"))
 
         if not basic_rows:
             print(f"  No basic box score found for {team_bref}")
             continue
 
-        # Build advanced lookup by player name
-        adv_lookup = {}
-        for arow in adv_rows:
-            pname = arow.get("player", "")
-            if pname:
-                adv_lookup[pname] = arow
-
-        for row in basic_rows:
-            player_name = row.get("player", "")
-            if not player_name:
-                continue
-
-            adv = adv_lookup.get(player_name, {})
+        # Both tables list the same players in the same order, so pair rows
+        # positionally; fall back to matching by name if they ever disagree.
+        if len(adv_rows) == len(basic_rows) and all(
+            row["player"] == adv["player"] for row, adv in zip(basic_rows, adv_rows)
+        ):
+            row_pairs = zip(basic_rows, adv_rows)
+        else:
+            adv_lookup = {adv["player"]: adv for adv in adv_rows}
+            row_pairs = ((row, adv_lookup.get(row["player"], {})) for row in basic_rows)
 
-            box_rows.append({
+        for row, adv in row_pairs:
+            player_name = row["player"]
+            box_row = {
                 "game_id": game_id,
                 "team_id": team_info["id"],
                 "player_name": player_name,
                 "minutes": row.get("mp") or None,
-                "points": safe_int(row.get("pts")),
-                "rebounds": safe_int(row.get("trb")),
-                "offensive_rebounds": safe_int(row.get("orb")),
-                "defensive_rebounds": safe_int(row.get("drb")),
-                "assists": safe_int(row.get("ast")),
-                "steals": safe_int(row.get("stl")),
-                "blocks": safe_int(row.get("blk")),
-                "turnovers": safe_int(row.get("tov")),
-                "fgm": safe_int(row.get("fg")),
-                "fga": safe_int(row.get("fga")),
-                "fg_pct": safe_float(row.get("fg_pct")),
-                "tpm": safe_int(row.get("fg3")),
-                "tpa": safe_int(row.get("fg3a")),
-                "tp_pct": safe_float(row.get("fg3_pct")),
-                "ftm": safe_int(row.get("ft")),
-                "fta": safe_int(row.get("fta")),
-                "ft_pct": safe_float(row.get("ft_pct")),
-                "personal_fouls": safe_int(row.get("pf")),
-                "plus_minus": safe_int(row.get("plus_minus")),
-                # advanced stats
-                "ts_pct": safe_float(adv.get("ts_pct")),
-                "efg_pct": safe_float(adv.get("efg_pct")),
-                "three_par": safe_float(adv.get("fg3a_per_fga_pct")),
-                "ft_rate": safe_float(adv.get("fta_per_fga_pct")),
-                "orb_pct": safe_float(adv.get("orb_pct")),
-                "drb_pct": safe_float(adv.get("drb_pct")),
-                "trb_pct": safe_float(adv.get("trb_pct")),
-                "ast_pct": safe_float(adv.get("ast_pct")),
-                "stl_pct": safe_float(adv.get("stl_pct")),
-                "blk_pct": safe_float(adv.get("blk_pct")),
-                "tov_pct": safe_float(adv.get("tov_pct")),
-                "usg_pct": safe_float(adv.get("usg_pct")),
-                "offensive_rating": safe_int(adv.get("off_rtg")),
-                "defensive_rating": safe_int(adv.get("def_rtg")),
-                "bpm": safe_float(adv.get("bpm")),
                 "starter": row.get("_starter", False),
-            })
+            }
+            box_row.update({col: stat_int(row.get(stat, "")) for col, stat in BASIC_INT_STATS})
+            box_row.update({col: stat_float(row.get(stat, "")) for col, stat in BASIC_FLOAT_STATS})
+            box_row.update({col: stat_int(adv.get(stat, "")) for col, stat in ADVANCED_INT_STATS})
+            box_row.update({col: stat_float(adv.get(stat, "")) for col, stat in ADVANCED_FLOAT_STATS})
+            box_rows.append(box_row)
 
     if not box_rows:
-        print("  No box score rows parsed")
-        return False
-
-    # Upsert box scores
-    try:
-        supabase.table("box_scores").upsert(
-            box_rows,
-            on_conflict="game_id,team_id,player_name",
-        ).execute()
-        print(f"  Inserted {len(box_rows)} box score rows")
-    except Exception as e:
-        print(f"  Error inserting box scores: {e}")
-        return False
+        print(f"  {away_abbrev} @ {home_abbrev}: no box score rows parsed")
+        return None
+    print(f"  {away_abbrev} @ {home_abbrev}: parsed {len(box_rows)} box score rows")
 
     # 2) Parse quarter scores + arena/attendance from same page
+    return box_rows, parse_game_metadata(tree)
+
+
+def parse_game_metadata(tree) -> dict:
+    """Collect the games columns a box score page fills in, dropping missing values."""
     update_data = {}
 
-    quarter_data = parse_quarter_scores(soup)
+    quarter_data = parse_quarter_scores(tree)
     if quarter_data:
         update_data.update({k: v for k, v in quarter_data.items() if v is not None})
 
-    arena, attendance = parse_arena_attendance(soup)
-    playoff_round = parse_playoff_round(soup)
+    arena, attendance = parse_arena_attendance(tree)
+    playoff_round = parse_playoff_round(tree)
     if playoff_round:
         update_data["playoff_round"] = playoff_round
 
@@ -358,35 +390,134 @@ def scrape_game(game: dict):
     if attendance:
         update_data["attendance"] = attendance
 
-    if update_data:
+    return update_data
+
+
+def copy_box_scores(box_rows: list[dict]):
+    """Bulk-load box score rows with COPY into a temp table, then upsert from it."""
+    columns = list(box_rows[0])
+    column_list = sql.SQL(", ").join(map(sql.Identifier, columns))
+    updates = sql.SQL(", ").join(
+        sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(c))
+        for c in columns
+        if c not in BOX_SCORE_KEY
+    )
+
+    with psycopg.connect(SUPABASE_DB_URL) as conn, conn.cursor() as cur:
+        cur.execute(
+            "CREATE TEMP TABLE box_scores_stg "
+            "(LIKE public.box_scores INCLUDING DEFAULTS) ON COMMIT DROP"
+        )
+        with cur.copy(sql.SQL("COPY box_scores_stg ({}) FROM STDIN").format(column_list)) as copy:
+            for row in box_rows:
+                copy.write_row([row[c] for c in columns])
+        cur.execute(
+            sql.SQL(
+                "INSERT INTO public.box_scores ({columns}) "
+                "SELECT {columns} FROM box_scores_stg "
+                "ON CONFLICT ({key}) DO UPDATE SET {updates}"
+            ).format(
+                columns=column_list,
+                key=sql.SQL(", ").join(map(sql.Identifier, BOX_SCORE_KEY)),
+                updates=updates,
+            )
+        )
+
+
+def store_box_scores(box_rows: list[dict]):
+    """Upsert box score rows, via COPY when a direct DB URL is configured."""
+    if SUPABASE_DB_URL and psycopg is not None:
+        try:
+            copy_box_scores(box_rows)
+            return
+        except psycopg.Error as e:
+            print(f"\nCOPY into box_scores failed ({e}), falling back to REST upsert")
+
+    for start in range(0, len(box_rows), UPSERT_CHUNK_ROWS):
+        supabase.table("box_scores").upsert(
+            box_rows[start:start + UPSERT_CHUNK_ROWS],
+            on_conflict=",".join(BOX_SCORE_KEY),
+        ).execute()
+
+
+def flush_pending(box_rows: list[dict], game_updates: list[dict]) -> bool:
+    """Write accumulated box score rows and game updates in bulk.
+
+    Box scores go first, so game metadata is only written for games whose
+    box scores were stored.
+    """
+    try:
+        store_box_scores(box_rows)
+        print(f"\nInserted {len(box_rows)} box score rows")
+    except Exception as e:
+        print(f"\nError inserting box scores: {e}")
+        return False
+
+    if game_updates:
         try:
-            supabase.table("games").update(update_data).eq("id", game_id).execute()
-            print(f"  Updated game with: {list(update_data.keys())}")
+            supabase.rpc("apply_game_scrape_updates", {"updates": game_updates}).execute()
+            print(f"Updated {len(game_updates)} games")
         except Exception as e:
-            print(f"  Error updating game: {e}")
+            print(f"Error updating games: {e}")
 
     return True
 
 
+def _backfill_games(games: list[dict], parse_fn):
+    """Re-parse each game's page with parse_fn and apply the updates in one RPC.
+
+    parse_fn takes the page tree and returns the games columns to set, or an
+    empty dict when the page has nothing to backfill.
+    """
+    updates = []
+    for game in games:
+        game_date = game["game_date_utc"]
+        game_id = game["id"]
+
+        print(f"\nBackfilling {game_id} ({game_date[:10]})...")
+        tree, url = fetch_game_page(game["home_team"]["abbreviation"], game_date)
+        if tree is None:
+            continue
+
+        update_data = parse_fn(tree)
+        del tree
+        if update_data:
+            updates.append({"id": game_id, **update_data})
+            print(f"  Found {', '.join(f'{k} = {v}' for k, v in update_data.items())}")
+        else:
+            print("  Nothing to backfill found on page")
+
+    success = 0
+    if updates:
+        try:
+            supabase.rpc("apply_game_scrape_updates", {"updates": updates}).execute()
+            success = len(updates)
+        except Exception as e:
+            print(f"\nError updating: {e}")
+
+    print(f"\nDone! Backfilled {success}/{len(games)} games.")
+
+
+def parse_playoff_round_update(tree) -> dict:
+    """Games update for the playoff round in the page title, if there is one."""
+    playoff_round = parse_playoff_round(tree)
+    return {"playoff_round": playoff_round} if playoff_round else {}
+
+
 def backfill_playoff_rounds(season_year: int, limit: int | None):
     """Re-scrape playoff games that are missing playoff_round."""
-    season_res = supabase.table("seasons").select("id").eq("year", season_year).execute()
-    if not season_res.data:
-        print(f"No season found for year {season_year}")
-        sys.exit(1)
-    season_ids = [s["id"] for s in season_res.data]
-
     query = (
         supabase.table("games")
         .select(
             "id, game_date_utc, home_team_id, away_team_id, "
             "home_team:teams!games_home_team_id_fkey(id, abbreviation), "
-            "away_team:teams!games_away_team_id_fkey(id, abbreviation)"
+            "away_team:teams!games_away_team_id_fkey(id, abbreviation), "
+            "season:seasons!inner(year)"
         )
         .eq("postseason", True)
         .is_("playoff_round", "null")
         .not_.is_("home_q1", "null")  # already scraped
-        .in_("season_id", season_ids)
+        .eq("season.year", season_year)
         .order("game_date_utc", desc=False)
         .limit(limit if limit else 2000)
     )
@@ -394,32 +525,27 @@ def backfill_playoff_rounds(season_year: int, limit: int | None):
     res = query.execute()
     games = res.data or []
     print(f"Found {len(games)} playoff games to backfill")
+    _backfill_games(games, parse_playoff_round_update)
 
-    success = 0
-    for game in games:
-        home_team = game["home_team"]
-        home_abbrev = home_team["abbreviation"]
-        game_date = game["game_date_utc"]
-        game_id = game["id"]
 
-        print(f"\nBackfilling {game_id} ({game_date[:10]})...")
-        time.sleep(3.5)
-        soup, url = fetch_game_page(home_abbrev, game_date)
-        if not soup:
-            continue
-
-        playoff_round = parse_playoff_round(soup)
-        if playoff_round:
-            try:
-                supabase.table("games").update({"playoff_round": playoff_round}).eq("id", game_id).execute()
-                print(f"  Set playoff_round = {playoff_round}")
-                success += 1
-            except Exception as e:
-                print(f"  Error updating: {e}")
-        else:
-            print("  No playoff round found in title")
+def backfill_game_metadata(season_year: int, limit: int | None):
+    """Re-scrape metadata for games whose box scores were stored but games update failed."""
+    query = (
+        supabase.table("games_missing_scrape_metadata")
+        .select(
+            "id, game_date_utc, "
+            "home_team:teams!games_home_team_id_fkey(id, abbreviation), "
+            "season:seasons!inner(year)"
+        )
+        .eq("season.year", season_year)
+        .order("game_date_utc", desc=False)
+        .limit(limit if limit else 2000)
+    )
 
-    print(f"\nDone! Backfilled {success}/{len(games)} games.")
+    res = query.execute()
+    games = res.data or []
+    print(f"Found {len(games)} games missing metadata")
+    _backfill_games(games, parse_game_metadata)
 
 
 def main():
@@ -427,20 +553,65 @@ def main():
     parser.add_argument("--season", type=int, required=True, help="Season year (e.g. 2024 for 2024-25)")
     parser.add_argument("--days", type=int, default=None, help="Only scrape games from last N days")
     parser.add_argument("--limit", type=int, default=None, help="Max number of games to scrape")
-    parser.add_argument("--backfill-playoffs", action="store_true",
-                        help="Re-scrape playoff games missing playoff_round")
+    backfill = parser.add_mutually_exclusive_group()
+    backfill.add_argument("--backfill-playoffs", action="store_true",
+                          help="Re-scrape playoff games missing playoff_round")
+    backfill.add_argument("--backfill-metadata", action="store_true",
+                          help="Re-scrape quarter scores/arena/attendance for games whose box scores "
+                               "are stored but whose games update failed")
     args = parser.parse_args()
 
     if args.backfill_playoffs:
         backfill_playoff_rounds(args.season, args.limit)
+    elif args.backfill_metadata:
+        backfill_game_metadata(args.season, args.limit)
     else:
         games = fetch_games_without_box_scores(args.season, args.days, args.limit)
         print(f"Found {len(games)} games to scrape")
 
+        # Fetch on a background thread so parsing and DB writes overlap the
+        # rate-limited requests; the bounded queue caps fetched-but-unparsed pages.
+        pages = queue.Queue(maxsize=4)
+        threading.Thread(target=fetch_game_pages, args=(games, pages), daemon=True).start()
+
         success = 0
-        for game in games:
-            if scrape_game(game):
-                success += 1
+        pending_games = 0
+        pending_box_rows = []
+        pending_game_updates = []
+        # Flush whatever is buffered even if the run is interrupted or a
+        # parse raises, so up to FLUSH_EVERY_GAMES scraped games aren't lost.
+        try:
+            while (page := pages.get()) is not None:
+                game, tree = page
+                del page
+                if tree is None:
+                    continue
+
+                # Only plain-str rows survive parsing, so the page tree can be
+                # freed before it's buffered behind hundreds of other games.
+                result = scrape_game(game, tree)
+                del tree
+                if not result:
+                    # The game stays unscraped, so make its next run refetch
+                    # the page rather than re-read this copy from cache
+                    evict_page(SESSION, game_page_url(game["home_team"]["abbreviation"], game["game_date_utc"]))
+                    continue
+
+                box_rows, update_data = result
+                pending_games += 1
+                pending_box_rows.extend(box_rows)
+                if update_data:
+                    pending_game_updates.append({"id": game["id"], **update_data})
+
+                if pending_games >= FLUSH_EVERY_GAMES:
+                    if flush_pending(pending_box_rows, pending_game_updates):
+                        success += pending_games
+                    pending_games = 0
+                    pending_box_rows = []
+                    pending_game_updates = []
+        finally:
+            if pending_games and flush_pending(pending_box_rows, pending_game_updates):
+                success += pending_games
 
         print(f"\nDone! Scraped {success}/{len(games)} games successfully.")
 
@@ -6,22 +6,27 @@ Usage:
   python scripts/scrape_players.py --season 2025
   python scripts/scrape_players.py --season 2025 --team BOS
   python scripts/scrape_players.py --season 2025 --averages
+  python scripts/scrape_players.py --season 2025 --averages --force
+
+Fetched pages are cached in scripts/.cache/bref_cache.sqlite for a day;
+--force also refetches player pages instead of reading them from the cache.
 """
 
 import argparse
 import os
 import re
 import sys
-import time
 import zlib
-from datetime import datetime
+from datetime import timedelta
 
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from dotenv import load_dotenv
 from nba_api.stats.static import players as nba_players
 from supabase import create_client, Client
 
+from bref_http import COMMENTED_DIV_RE, create_session, get_page, stat_float, stat_int
+
 load_dotenv()
 
 SUPABASE_URL = os.environ.get("SUPABASE_URL") or os.environ["EXPO_PUBLIC_SUPABASE_URL"]
@@ -43,37 +48,19 @@ ACTIVE_TEAMS = {
     "OKC", "ORL", "PHI", "PHX", "POR", "SAC", "SAS", "TOR", "UTA", "WAS",
 }
 
-HEADERS = {"User-Agent": "Mozilla/5.0 (Macintosh)"}
-RATE_LIMIT_SECONDS = 3.5
+# Only build soup for the one table each page is scraped for
+ROSTER_TABLE = SoupStrainer("table", id="roster")
+PER_GAME_TABLE = SoupStrainer("table", id="per_game")
+
+# Rosters and season averages change during the season, so cached pages
+# only keep for a day.
+SESSION = create_session(expire_after=timedelta(days=1))
 
 
 def to_bref(abbrev: str) -> str:
     return ABBREV_TO_BREF.get(abbrev, abbrev)
 
 
-def slug_to_provider_id(slug: str) -> int:
-    """Convert a bref player slug (e.g. 'curryst01') to a stable integer ID."""
-    return zlib.adler32(slug.encode("utf-8"))
-
-
-def safe_int(val) -> int | None:
-    if val is None or str(val).strip() == "":
-        return None
-    try:
-        return int(float(val))
-    except (ValueError, TypeError):
-        return None
-
-
-def safe_float(val) -> float | None:
-    if val is None or str(val).strip() == "":
-        return None
-    try:
-        return round(float(val), 3)
-    except (ValueError, TypeError):
-        return None
-
-
 def parse_height(ht_str: str) -> str | None:
     """Parse height like '6-3' or '6\\'3\"' and return as-is (text field)."""
     if not ht_str or ht_str.strip() == "":
@@ -81,22 +68,6 @@ def parse_height(ht_str: str) -> str | None:
     return ht_str.strip()
 
 
-def parse_birth_date(date_str: str) -> str | None:
-    """Parse birth date string; return None if unparseable."""
-    if not date_str or date_str.strip() == "":
-        return None
-    try:
-        dt = datetime.strptime(date_str.strip(), "%B %d, %Y")
-        return dt.strftime("%Y-%m-%d")
-    except ValueError:
-        pass
-    try:
-        dt = datetime.strptime(date_str.strip(), "%b %d, %Y")
-        return dt.strftime("%Y-%m-%d")
-    except ValueError:
-        return None
-
-
 def load_teams():
     """Load all teams from Supabase, returning {abbreviation: uuid} map."""
     res = supabase.table("teams").select("id, abbreviation").execute()
@@ -117,12 +88,16 @@ def fetch_roster_page(bref_abbrev: str, season: int):
     # Basketball Reference URL already uses the ending year (e.g. /teams/MIA/2025.html = 2024-25)
     url = f"https://www.basketball-reference.com/teams/{bref_abbrev}/{season}.html"
 
-    resp = requests.get(url, headers=HEADERS)
+    try:
+        resp = get_page(SESSION, url)
+    except requests.RequestException as e:
+        print(f"  Failed to fetch {url} ({e})")
+        return None, url
     if resp.status_code != 200:
         print(f"  Failed to fetch {url} (status {resp.status_code})")
         return None, url
 
-    soup = BeautifulSoup(resp.text, "html.parser")
+    soup = BeautifulSoup(resp.content, "lxml", parse_only=ROSTER_TABLE)
     return soup, url
 
 
@@ -182,14 +157,6 @@ def parse_roster(soup) -> list[dict]:
         wt = cells.get("weight")
         wt_text = wt.get_text(strip=True) if wt else None
 
-        birth = cells.get("birth_date")
-        birth_text = None
-        if birth:
-            # Try data-stat attribute first, then text
-            birth_link = birth.find("a")
-            raw = birth_link.get_text(strip=True) if birth_link else birth.get_text(strip=True)
-            birth_text = parse_birth_date(raw)
-
         college_cell = cells.get("college")
         college_text = None
         if college_cell:
@@ -220,6 +187,28 @@ def parse_roster(soup) -> list[dict]:
     return players
 
 
+def rekey_legacy_players(slugs: list[str]):
+    """Move bref players stored under the old adler32 provider ID onto their slug.
+
+    Rows scraped before provider_player_id became text hold str(adler32(slug));
+    without this, upserting by slug would duplicate those players.
+    """
+    legacy_ids = {str(zlib.adler32(slug.encode("utf-8"))): slug for slug in slugs}
+    res = supabase.table("players").select("id, provider_player_id").eq(
+        "provider", "bref"
+    ).in_("provider_player_id", list(legacy_ids)).execute()
+
+    for r in res.data or []:
+        slug = legacy_ids[r["provider_player_id"]]
+        try:
+            supabase.table("players").update({"provider_player_id": slug}).eq("id", r["id"]).execute()
+        except Exception as e:
+            print(f"  Error re-keying player {r['id']} to {slug}: {e}")
+
+    if res.data:
+        print(f"\nRe-keyed {len(res.data)} players from hashed IDs to bref slugs")
+
+
 def scrape_rosters(season: int, team_filter: str | None):
     """Scrape rosters for all (or one) teams and upsert into players table."""
     teams = load_teams()
@@ -246,7 +235,6 @@ def scrape_rosters(season: int, team_filter: str | None):
         bref_abbrev = to_bref(abbrev)
         print(f"\n{abbrev} ({bref_abbrev})...")
 
-        time.sleep(RATE_LIMIT_SECONDS)
         soup, url = fetch_roster_page(bref_abbrev, season)
         if not soup:
             continue
@@ -283,7 +271,7 @@ def scrape_rosters(season: int, team_filter: str | None):
 
         row = {
             "provider": "bref",
-            "provider_player_id": slug_to_provider_id(p["slug"]),
+            "provider_player_id": p["slug"],
             "first_name": p["first_name"],
             "last_name": p["last_name"],
             "position": p["position"],
@@ -298,6 +286,7 @@ def scrape_rosters(season: int, team_filter: str | None):
         seen[row["provider_player_id"]] = row
 
     upsert_rows = list(seen.values())
+    rekey_legacy_players(list(seen))
 
     try:
         supabase.table("players").upsert(
@@ -312,20 +301,23 @@ def scrape_rosters(season: int, team_filter: str | None):
     return all_players
 
 
-def fetch_player_page(slug: str):
-    """Fetch a player's main page from Basketball Reference."""
+def fetch_player_page(slug: str, force: bool = False):
+    """Fetch a player's main page from Basketball Reference, skipping the cache if force is set."""
     letter = slug[0]
     url = f"https://www.basketball-reference.com/players/{letter}/{slug}.html"
 
-    resp = requests.get(url, headers=HEADERS)
+    try:
+        resp = get_page(SESSION, url, force=force)
+    except requests.RequestException as e:
+        print(f"    Failed to fetch {url} ({e})")
+        return None
     if resp.status_code != 200:
         print(f"    Failed to fetch {url} (status {resp.status_code})")
         return None
 
-    html = resp.text
     # Uncomment hidden tables (bref hides some in comments)
-    html = re.sub(r'<!--\s*(<div[^>]*>.*?</div>)\s*-->', r'\1', html, flags=re.DOTALL)
-    return BeautifulSoup(html, "html.parser")
+    html = COMMENTED_DIV_RE.sub(rb"\1", resp.content)
+    return BeautifulSoup(html, "lxml", parse_only=PER_GAME_TABLE)
 
 
 def parse_season_averages(soup, season: int) -> dict | None:
@@ -365,49 +357,61 @@ def parse_season_averages(soup, season: int) -> dict | None:
         }
 
         return {
-            "games": safe_int(cells.get("g")),
-            "mpg": safe_float(cells.get("mp_per_g")),
-            "ppg": safe_float(cells.get("pts_per_g")),
-            "rpg": safe_float(cells.get("trb_per_g")),
-            "apg": safe_float(cells.get("ast_per_g")),
-            "spg": safe_float(cells.get("stl_per_g")),
-            "bpg": safe_float(cells.get("blk_per_g")),
-            "topg": safe_float(cells.get("tov_per_g")),
-            "fg_pct": safe_float(cells.get("fg_pct")),
-            "tp_pct": safe_float(cells.get("fg3_pct")),
-            "ft_pct": safe_float(cells.get("ft_pct")),
+            "games": stat_int(cells.get("g", "")),
+            "mpg": stat_float(cells.get("mp_per_g", "")),
+            "ppg": stat_float(cells.get("pts_per_g", "")),
+            "rpg": stat_float(cells.get("trb_per_g", "")),
+            "apg": stat_float(cells.get("ast_per_g", "")),
+            "spg": stat_float(cells.get("stl_per_g", "")),
+            "bpg": stat_float(cells.get("blk_per_g", "")),
+            "topg": stat_float(cells.get("tov_per_g", "")),
+            "fg_pct": stat_float(cells.get("fg_pct", "")),
+            "tp_pct": stat_float(cells.get("fg3_pct", "")),
+            "ft_pct": stat_float(cells.get("ft_pct", "")),
         }
 
     return None
 
 
-def scrape_averages(season: int, players: list[dict]):
-    """Scrape per-game season averages for each player."""
+def scrape_averages(season: int, players: list[dict], force: bool = False):
+    """Scrape per-game season averages for each player.
+
+    Players that already have a row for this season are skipped unless
+    force is set, so re-runs only fetch pages for new players. With force,
+    every player page is refetched rather than served from the cache.
+    """
     season_id = load_season(season)
 
     # Build slug -> player_id lookup
-    provider_ids = [slug_to_provider_id(p["slug"]) for p in players]
     res = supabase.table("players").select("id, provider_player_id").eq(
         "provider", "bref"
-    ).in_("provider_player_id", provider_ids).execute()
+    ).in_("provider_player_id", [p["slug"] for p in players]).execute()
 
-    pid_to_uuid = {r["provider_player_id"]: r["id"] for r in (res.data or [])}
+    slug_to_uuid = {r["provider_player_id"]: r["id"] for r in (res.data or [])}
+
+    have_averages = set()
+    if not force:
+        done = supabase.table("player_season_averages").select("player_id").eq(
+            "season_id", season_id
+        ).execute()
+        have_averages = {r["player_id"] for r in (done.data or [])}
 
     print(f"\nScraping season averages for {len(players)} players...")
 
     upsert_rows = []
     for i, p in enumerate(players):
         slug = p["slug"]
-        provider_id = slug_to_provider_id(slug)
-        player_uuid = pid_to_uuid.get(provider_id)
+        player_uuid = slug_to_uuid.get(slug)
         if not player_uuid:
             print(f"  {p['first_name']} {p['last_name']}: not found in DB, skipping")
             continue
+        if player_uuid in have_averages:
+            print(f"  {p['first_name']} {p['last_name']}: averages already scraped, skipping")
+            continue
 
-        time.sleep(RATE_LIMIT_SECONDS)
         print(f"  [{i+1}/{len(players)}] {p['first_name']} {p['last_name']}...")
 
-        soup = fetch_player_page(slug)
+        soup = fetch_player_page(slug, force)
         if not soup:
             continue
 
@@ -450,12 +454,17 @@ def main():
         "--averages", action="store_true",
         help="Also scrape per-game season averages for each player"
     )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="With --averages, re-scrape players that already have averages for the season, "
+             "refetching their pages instead of using the cache"
+    )
     args = parser.parse_args()
 
     players = scrape_rosters(args.season, args.team)
 
     if args.averages and players:
-        scrape_averages(args.season, players)
+        scrape_averages(args.season, players, args.force)
 
     print("\nDone!")
 
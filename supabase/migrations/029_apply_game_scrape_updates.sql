@@ -0,0 +1,37 @@
+-- Migration 029: Batch-apply scraped game metadata in one round trip
+-- Accepts a JSONB array like [{ "id": "<game uuid>", "home_q1": 28, "arena": "...", ... }]
+-- Only keys present (non-null) on each element overwrite the existing column.
+-- Runs as the caller (service role during ingestion); not exposed to app users.
+
+CREATE OR REPLACE FUNCTION public.apply_game_scrape_updates(updates jsonb)
+RETURNS integer LANGUAGE plpgsql AS $$
+DECLARE v_count integer;
+BEGIN
+  UPDATE public.games g SET
+    home_q1       = COALESCE(u.home_q1, g.home_q1),
+    home_q2       = COALESCE(u.home_q2, g.home_q2),
+    home_q3       = COALESCE(u.home_q3, g.home_q3),
+    home_q4       = COALESCE(u.home_q4, g.home_q4),
+    home_ot       = COALESCE(u.home_ot, g.home_ot),
+    away_q1       = COALESCE(u.away_q1, g.away_q1),
+    away_q2       = COALESCE(u.away_q2, g.away_q2),
+    away_q3       = COALESCE(u.away_q3, g.away_q3),
+    away_q4       = COALESCE(u.away_q4, g.away_q4),
+    away_ot       = COALESCE(u.away_ot, g.away_ot),
+    arena         = COALESCE(u.arena, g.arena),
+    attendance    = COALESCE(u.attendance, g.attendance),
+    playoff_round = COALESCE(u.playoff_round, g.playoff_round),
+    updated_at    = now()
+  FROM jsonb_to_recordset(updates) AS u(
+    id uuid,
+    home_q1 smallint, home_q2 smallint, home_q3 smallint, home_q4 smallint, home_ot smallint,
+    away_q1 smallint, away_q2 smallint, away_q3 smallint, away_q4 smallint, away_ot smallint,
+    arena text, attendance integer, playoff_round text
+  )
+  WHERE g.id = u.id;
+  GET DIAGNOSTICS v_count = ROW_COUNT;
+  RETURN v_count;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.apply_game_scrape_updates(jsonb) FROM public, anon, authenticated;
@@ -0,0 +1,7 @@
+-- Migration 030: Store provider player IDs as text
+-- bref players are keyed by their slug (e.g. 'curryst01') instead of an
+-- adler32 hash of it. Existing integer IDs are kept as their text form;
+-- scrape_players.py re-keys hashed bref rows onto slugs as it sees them.
+
+ALTER TABLE public.players
+  ALTER COLUMN provider_player_id TYPE text USING provider_player_id::text;
@@ -0,0 +1,14 @@
+-- Migration 031: View of final games that have no box_scores rows yet
+-- Used by scripts/scrape_box_scores.py to pick games to scrape. Keying on the
+-- box_scores rows themselves (instead of games.home_q1 IS NULL) means a game
+-- whose box scores were stored is never re-fetched, even if its metadata
+-- update failed.
+
+CREATE OR REPLACE VIEW public.games_needing_box_scores
+WITH (security_invoker = true) AS
+SELECT g.*
+FROM public.games g
+WHERE g.status = 'final'
+  AND NOT EXISTS (
+    SELECT 1 FROM public.box_scores b WHERE b.game_id = g.id
+  );
@@ -0,0 +1,15 @@
+-- Migration 032: View of final games whose box scores are stored but whose
+-- scraped metadata (quarter scores, arena, attendance) never landed
+-- games_needing_box_scores skips these games once their box_scores rows exist,
+-- so scripts/scrape_box_scores.py --backfill-metadata uses this view to
+-- re-parse their pages and apply only the games update.
+
+CREATE OR REPLACE VIEW public.games_missing_scrape_metadata
+WITH (security_invoker = true) AS
+SELECT g.*
+FROM public.games g
+WHERE g.status = 'final'
+  AND g.home_q1 IS NULL
+  AND EXISTS (
+    SELECT 1 FROM public.box_scores b WHERE b.game_id = g.id
+  );
@@ -111,7 +111,7 @@ export interface Database {
         Row: {
           id: string;
           provider: string;
-          provider_player_id: number;
+          provider_player_id: string;
           first_name: string;
           last_name: string;
           position: string | null;
@@ -132,7 +132,7 @@ export interface Database {
         Insert: {
           id?: string;
           provider?: string;
-          provider_player_id: number;
+          provider_player_id: string;
           first_name: string;
           last_name: string;
           position?: string | null;